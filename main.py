@@ -1,12 +1,14 @@
+import hashlib
 import io
 import unicodedata
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import plotly.graph_objects as go
 import streamlit as st
-from plotly.subplots import make_subplots
 
 # =============================
 # Page config & Korean font
@@ -56,8 +58,9 @@ def nfc(s: str) -> str:
     return unicodedata.normalize("NFC", s)
 
 
-def same_name(a: str, b: str) -> bool:
-    return nfc(a) == nfc(b)
+def dir_entries(data_dir: Path) -> dict[str, Path]:
+    """NFC 정규화한 파일명 → 경로 매핑 (디렉터리 1회 스캔)"""
+    return {nfc(p.name): p for p in data_dir.iterdir() if p.is_file()}
 
 
 def find_data_dir(start: Path) -> Path | None:
@@ -73,40 +76,254 @@ def find_data_dir(start: Path) -> Path | None:
     return None
 
 
+# =============================
+# Disk cache (parquet)
+# =============================
+# 소스 파일 내용이 바뀌면 키가 달라지도록 파일명/mtime/size를 해시에 포함.
+# 로더 출력 스키마가 바뀔 때는 버전을 올려 이전 캐시를 무효화한다.
+_CACHE_VERSION = 4
+
+
+def _disk_cache_path(data_dir: Path, tag: str, sources: list[Path]) -> Path:
+    h = hashlib.md5(f"v{_CACHE_VERSION}:{tag}".encode())
+    for p in sorted(sources):
+        stat = p.stat()
+        h.update(f"{nfc(p.name)}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+    return data_dir / ".cache" / f"{tag}-{h.hexdigest()}.parquet"
+
+
+def _read_disk_cache(path: Path) -> pd.DataFrame | None:
+    if not path.exists():
+        return None
+    try:
+        return pd.read_parquet(path, engine="pyarrow")
+    except Exception:
+        return None
+
+
+def _write_disk_cache(df: pd.DataFrame, path: Path) -> None:
+    try:
+        path.parent.mkdir(exist_ok=True)
+        df.to_parquet(path, engine="pyarrow")
+    except Exception:
+        pass  # 캐시는 best-effort
+
+
 # =============================
 # Data loading
 # =============================
+# 센서값은 float32면 충분 — 명시적 스키마로 dtype 추론 2-pass를 건너뜀.
+# time은 어느 탭에서도 쓰지 않으므로 datetime 파싱 없이 문자열로 둔다
+# (학교별로 '2025-05-01 5:00:00', '2025.05.26 13:00:00', '2025.5.30 0:00'
+# 세 포맷이 섞여 있어 파싱 자체도 비싸다; 시계열 뷰가 생기면 그때 파싱).
+_ENV_CONVERT_OPTS = pacsv.ConvertOptions(
+    column_types={
+        "temperature": pa.float32(),
+        "humidity": pa.float32(),
+        "ph": pa.float32(),
+        "ec": pa.float32(),
+        "time": pa.string(),
+    },
+)
+
+
 @st.cache_data
 def load_environment_data(data_dir: Path) -> pd.DataFrame:
-    dfs = []
+    entries = dir_entries(data_dir)
+    paths = []
     for fname in ENV_FILES:
-        for p in data_dir.iterdir():
-            if p.is_file() and same_name(p.name, fname):
-                df = pd.read_csv(p)
-                df.columns = [c.strip() for c in df.columns]
-                df["time"] = pd.to_datetime(df["time"], errors="coerce")
-                df["school"] = fname.split("_")[0]
-                dfs.append(df)
-                break
-
-    if not dfs:
+        p = entries.get(nfc(fname))
+        if p is not None:
+            paths.append((fname, p))
+
+    if not paths:
         return pd.DataFrame()
 
-    return pd.concat(dfs, ignore_index=True)
+    cache = _disk_cache_path(data_dir, "env", [p for _, p in paths])
+    cached = _read_disk_cache(cache)
+    if cached is not None:
+        return cached
+
+    dfs = []
+    for fname, p in paths:
+        df = pacsv.read_csv(p, convert_options=_ENV_CONVERT_OPTS).to_pandas()
+        df.columns = [c.strip() for c in df.columns]
+        df["school"] = fname.split("_")[0]
+        dfs.append(df)
+
+    out = pd.concat(dfs, ignore_index=True)
+    # 센서값은 float32로 고정 (Arrow 스키마와 무관하게 로더의 불변식으로 보장)
+    num_cols = ["temperature", "humidity", "ph", "ec"]
+    out[num_cols] = out[num_cols].astype("float32")
+    # 문자열 대신 int8 코드로 groupby/비교하도록 categorical로 변환
+    out["school"] = pd.Categorical(out["school"], categories=SCHOOLS)
+    # concat/astype으로 조각난 블록을 C-연속 단일 블록으로 재배치
+    # (조각난 BlockManager는 groupby.mean을 크게 느리게 만든다)
+    out = out.copy()
+    _write_disk_cache(out, cache)
+    return out
 
 
 @st.cache_data
 def load_growth_data(data_dir: Path) -> pd.DataFrame:
-    for p in data_dir.iterdir():
-        if p.is_file() and same_name(p.name, GROWTH_FILE):
-            sheets = pd.read_excel(p, sheet_name=None, engine="openpyxl")
-            rows = []
-            for sheet, df in sheets.items():
-                df.columns = [c.strip() for c in df.columns]
-                df["school"] = sheet
-                rows.append(df)
-            return pd.concat(rows, ignore_index=True)
-    return pd.DataFrame()
+    p = dir_entries(data_dir).get(nfc(GROWTH_FILE))
+    if p is None:
+        return pd.DataFrame()
+
+    cache = _disk_cache_path(data_dir, "growth", [p])
+    cached = _read_disk_cache(cache)
+    if cached is not None:
+        return cached
+
+    try:
+        # calamine이 openpyxl보다 XLSX 파싱이 훨씬 빠름
+        sheets = pd.read_excel(p, sheet_name=None, engine="calamine")
+    except ImportError:
+        sheets = pd.read_excel(p, sheet_name=None, engine="openpyxl")
+    rows = []
+    for sheet, df in sheets.items():
+        df.columns = [c.strip() for c in df.columns]
+        df["school"] = sheet
+        rows.append(df)
+
+    out = pd.concat(rows, ignore_index=True)
+    out["school"] = pd.Categorical(out["school"], categories=SCHOOLS)
+    out = out.copy()  # 블록 통합 (env 로더와 동일)
+    _write_disk_cache(out, cache)
+    return out
+
+
+# =============================
+# Cached aggregates
+# =============================
+def _grouped_means(codes: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """그룹 코드별 평균 — 그룹 수가 적을 때 groupby.mean보다 빠른 bincount 한 번.
+
+    groupby.mean과 동일하게 NaN은 건너뛴다.
+    """
+    nan = np.isnan(values)
+    if nan.any():
+        codes, values = codes[~nan], values[~nan]
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=values, minlength=n_groups)
+    with np.errstate(invalid="ignore"):  # 빈 그룹은 NaN
+        return sums / counts
+
+
+# 데이터가 바뀌지 않는 한 rerun마다 집계를 다시 돌릴 이유가 없음
+@st.cache_data
+def env_school_means(env_df: pd.DataFrame) -> pd.DataFrame:
+    # 카테고리 순서가 SCHOOLS로 고정돼 있어 코드가 곧 차트 순서
+    codes = env_df["school"].cat.codes.to_numpy()
+    out = {"school": SCHOOLS}
+    for col in ["temperature", "humidity", "ph", "ec"]:
+        out[col] = _grouped_means(codes, env_df[col].to_numpy(), len(SCHOOLS))
+    return pd.DataFrame(out)
+
+
+@st.cache_data
+def school_slices(df: pd.DataFrame) -> dict[str, slice]:
+    """학교별 연속 행 구간.
+
+    로더가 학교 단위로 concat하므로 각 학교는 한 구간을 차지한다 —
+    boolean mask + copy 대신 O(1) iloc 슬라이스(뷰)로 필터링하기 위한 맵.
+    비연속인 학교가 있으면 빈 dict를 돌려 mask 경로로 폴백한다.
+    """
+    codes = df["school"].cat.codes.to_numpy()
+    if len(codes) == 0:
+        return {}
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate(([0], bounds))
+    stops = np.concatenate((bounds, [len(codes)]))
+    cats = df["school"].cat.categories
+    slices: dict[str, slice] = {}
+    for a, b in zip(starts, stops):
+        s = cats[codes[a]]
+        if s in slices:
+            return {}
+        slices[s] = slice(int(a), int(b))
+    return slices
+
+
+@st.cache_data
+def school_overview(growth_df: pd.DataFrame) -> pd.DataFrame:
+    counts = growth_df["school"].value_counts().reindex(SCHOOLS, fill_value=0)
+    return pd.DataFrame(
+        {
+            "학교": SCHOOLS,
+            "EC 목표": [EC_TARGET[s] for s in SCHOOLS],
+            "개체수": counts.astype(int).to_numpy(),
+        }
+    )
+
+
+@st.cache_data
+def growth_ec_means(growth_df: pd.DataFrame) -> pd.DataFrame:
+    codes, uniques = pd.factorize(growth_df["EC"], sort=True)
+    means = _grouped_means(codes, growth_df["생중량(g)"].to_numpy(), len(uniques))
+    return pd.DataFrame({"EC": uniques, "생중량(g)": means})
+
+
+@st.cache_data
+def growth_xlsx_bytes(growth_df: pd.DataFrame) -> bytes:
+    """다운로드용 XLSX 바이트 — 데이터가 바뀔 때만 다시 생성"""
+    buf = io.BytesIO()
+    try:
+        growth_df.to_excel(buf, index=False, engine="xlsxwriter")
+    except ImportError:
+        growth_df.to_excel(buf, index=False, engine="openpyxl")
+    return buf.getvalue()
+
+
+# 2x2 서브플롯의 (지표 컬럼, 제목, x/y축 id, 축 domain) 배치
+_ENV_SUBPLOTS = [
+    ("temperature", "평균 온도", "x", "y", (0.0, 0.45), (0.575, 1.0)),
+    ("humidity", "평균 습도", "x2", "y2", (0.55, 1.0), (0.575, 1.0)),
+    ("ph", "평균 pH", "x3", "y3", (0.0, 0.45), (0.0, 0.425)),
+    ("ec", "평균 EC", "x4", "y4", (0.55, 1.0), (0.0, 0.425)),
+]
+
+
+@st.cache_data
+def env_overview_fig(avg_env: pd.DataFrame) -> dict:
+    """
+    Tab 2의 2x2 막대 서브플롯을 raw dict 스펙으로 구성.
+    go.Figure/make_subplots의 trace별 검증 비용을 건너뛴다.
+    """
+    xs = avg_env["school"].tolist()
+    data = []
+    layout: dict = {
+        "height": 700,
+        "font": {"family": PLOTLY_FONT},
+        "showlegend": False,
+        "annotations": [],
+    }
+    for col, title, xa, ya, xdom, ydom in _ENV_SUBPLOTS:
+        data.append(
+            {
+                "type": "bar",
+                "x": xs,
+                "y": avg_env[col].tolist(),
+                "xaxis": xa,
+                "yaxis": ya,
+            }
+        )
+        layout["xaxis" + xa[1:]] = {"domain": list(xdom), "anchor": ya}
+        layout["yaxis" + ya[1:]] = {"domain": list(ydom), "anchor": xa}
+        layout["annotations"].append(
+            {
+                "text": title,
+                "x": (xdom[0] + xdom[1]) / 2,
+                "y": ydom[1],
+                "xref": "paper",
+                "yref": "paper",
+                "xanchor": "center",
+                "yanchor": "bottom",
+                "showarrow": False,
+                "font": {"size": 16},
+            }
+        )
+    return {"data": data, "layout": layout}
 
 
 # =============================
@@ -142,14 +359,17 @@ if growth_df.empty:
 with st.sidebar:
     school = st.selectbox("학교 선택", [ALL] + SCHOOLS)
 
-def filt(df):
+def filt(df, slices):
     if school == ALL:
         return df
+    sl = slices.get(school)
+    if sl is not None:
+        return df.iloc[sl]
     return df[df["school"] == school]
 
 
-env_sel = filt(env_df)
-growth_sel = filt(growth_df)
+env_sel = filt(env_df, school_slices(env_df))
+growth_sel = filt(growth_df, school_slices(growth_df))
 
 # =============================
 # Tabs
@@ -161,61 +381,44 @@ tab1, tab2, tab3 = st.tabs(["📖 실험 개요", "🌡️ 환경 데이터", "
 # =============================
 with tab1:
     st.subheader("학교별 EC 조건")
-    rows = []
-    for s in SCHOOLS:
-        rows.append(
-            {
-                "학교": s,
-                "EC 목표": EC_TARGET[s],
-                "개체수": int((growth_df["school"] == s).sum()),
-            }
-        )
-    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    st.dataframe(
+        school_overview(growth_df), use_container_width=True, hide_index=True
+    )
 
 # =============================
 # Tab 2
 # =============================
 with tab2:
-    avg_env = (
-        env_df.groupby("school")[["temperature", "humidity", "ph", "ec"]]
-        .mean()
-        .reset_index()
-    )
-
-    fig = make_subplots(
-        rows=2,
-        cols=2,
-        subplot_titles=("평균 온도", "평균 습도", "평균 pH", "평균 EC"),
-    )
-
-    fig.add_bar(x=avg_env["school"], y=avg_env["temperature"], row=1, col=1)
-    fig.add_bar(x=avg_env["school"], y=avg_env["humidity"], row=1, col=2)
-    fig.add_bar(x=avg_env["school"], y=avg_env["ph"], row=2, col=1)
-    fig.add_bar(x=avg_env["school"], y=avg_env["ec"], row=2, col=2)
-
-    fig.update_layout(height=700, font=dict(family=PLOTLY_FONT))
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(env_overview_fig(env_school_means(env_df)), use_container_width=True)
 
 # =============================
 # Tab 3
 # =============================
 with tab3:
-    growth_df["EC"] = growth_df["school"].map(EC_TARGET)
-
-    summary = (
-        growth_df.groupby("EC")["생중량(g)"]
-        .mean()
-        .reset_index()
-        .sort_values("EC")
+    # 행별 dict 조회 대신 카테고리(4개)당 한 번만 EC를 찾고 코드로 gather
+    ec_values = np.array(
+        [EC_TARGET[s] for s in growth_df["school"].cat.categories],
+        dtype=np.float32,
     )
+    growth_df["EC"] = ec_values[growth_df["school"].cat.codes.to_numpy()]
 
-    fig = px.bar(
-        summary,
-        x="EC",
-        y="생중량(g)",
-        title="EC별 평균 생중량",
-        text="생중량(g)",
+    summary = growth_ec_means(growth_df)
+
+    fig = go.Figure(
+        go.Bar(
+            x=summary["EC"],
+            y=summary["생중량(g)"],
+            text=summary["생중량(g)"].round(2),
+        )
     )
     fig.add_vline(x=2.0, line_dash="dash", annotation_text="최적 EC (하늘고)")
-    fig.update_layout(font=dict(family=PLOTLY_FONT))
+    fig.update_layout(title="EC별 평균 생중량", font=dict(family=PLOTLY_FONT))
     st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("📥 데이터 다운로드"):
+        st.download_button(
+            "생육 결과 XLSX 다운로드",
+            data=growth_xlsx_bytes(growth_df),
+            file_name="4개교_생육결과데이터.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )